@@ -2,17 +2,32 @@
 Multi-Document Research Assistant - Streamlit App
 Compares long-context performance across different LLM providers.
 """
+import logging
+import queue
+import time
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 from document_loader import load_documents, count_tokens
-from query_handler import query_model
-from model_config import check_deepseek_balance
+from query_handler import aquery_models, aprefetch_answers, build_system_message, PREFETCH_MODEL
+from model_config import check_deepseek_balance, MODEL_PRICING
+from event_loop import submit
+from retriever import retrieve_context
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def log_prefetch_error(future):
+    """
+    Log a background prefetch that failed instead of dropping the error.
+    """
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Background prefetch failed", exc_info=future.exception())
+
+
 # Page config
 st.set_page_config(
     page_title="Multi-Document Research Assistant",
@@ -30,18 +45,28 @@ with st.sidebar:
 
     if st.button("Load Documents"):
         with st.spinner("Loading documents..."):
-            context, token_count, doc_names = load_documents("documents")
+            context, token_count, doc_names, page_token_counts, raw_token_count = load_documents("documents")
             st.session_state.context = context
             st.session_state.token_count = token_count
             st.session_state.doc_names = doc_names
+            st.session_state.page_token_counts = page_token_counts
+            st.session_state.raw_token_count = raw_token_count
+            st.session_state.prefetch_done = False
 
     if "token_count" in st.session_state:
         st.success(f"✅ Loaded {len(st.session_state.doc_names)} documents")
-        st.metric("Total Tokens", f"{st.session_state.token_count:,}")
+        saved_tokens = st.session_state.raw_token_count - st.session_state.token_count
+        st.metric(
+            "Total Tokens",
+            f"{st.session_state.token_count:,}",
+            f"-{saved_tokens:,} after cleanup",
+            delta_color="inverse"
+        )
+        st.caption(f"{st.session_state.raw_token_count:,} tokens before removing repeated headers/footers and whitespace")
 
         st.write("**Documents:**")
-        for name in st.session_state.doc_names:
-            st.write(f"• {name}")
+        for name, page_counts in zip(st.session_state.doc_names, st.session_state.page_token_counts):
+            st.write(f"• {name} ({len(page_counts)} pages, {sum(page_counts):,} tokens)")
 
     # Check DeepSeek balance
     st.divider()
@@ -81,6 +106,12 @@ else:
     with col4:
         use_deepseek_v31 = st.checkbox("DeepSeek v3.1-Terminus", value=True)
 
+    use_rag = st.toggle(
+        "Use RAG (top-k)",
+        value=False,
+        help="Send only the most relevant document chunks instead of the full context"
+    )
+
     # Question input
     st.subheader("Ask a Question")
 
@@ -116,20 +147,76 @@ else:
             if use_deepseek_v31:
                 selected_models.append("deepseek-chat-v3.1")
 
+            context = st.session_state.context
+            rag_error = None
+            if use_rag and selected_models:
+                try:
+                    context = retrieve_context(context, question)
+                except RuntimeError as e:
+                    rag_error = f"RAG mode is unavailable: {e}. Turn off 'Use RAG (top-k)' to query with the full context."
+
             if not selected_models:
                 st.error("Please select at least one model")
+            elif rag_error:
+                st.error(rag_error)
             else:
-                results = []
-
-                # Query each model
-                for model_name in selected_models:
-                    with st.spinner(f"Querying {model_name}..."):
-                        result = query_model(
-                            model_name,
-                            st.session_state.context,
-                            question
+                # Build the context prompt once and share it across models
+                system_message = build_system_message(context)
+
+                # Query all selected models concurrently on the background
+                # loop; streamed text arrives on a queue and is rendered here
+                token_queue = queue.Queue()
+                future = submit(aquery_models(
+                    selected_models,
+                    system_message,
+                    question,
+                    on_token=lambda model_name, text: token_queue.put((model_name, text))
+                ))
+
+                stream_area = st.empty()
+                with stream_area.container():
+                    placeholders = {}
+                    for model_name in selected_models:
+                        with st.expander(f"**{MODEL_PRICING[model_name]['name']}**", expanded=True):
+                            placeholders[model_name] = st.empty()
+
+                streamed = {model_name: "" for model_name in selected_models}
+                with st.spinner("Querying models in parallel..."):
+                    while True:
+                        finished = future.done()
+                        updated = set()
+                        while not token_queue.empty():
+                            model_name, text = token_queue.get_nowait()
+                            streamed[model_name] += text
+                            updated.add(model_name)
+                        for model_name in updated:
+                            placeholders[model_name].markdown(streamed[model_name])
+                        if finished:
+                            break
+                        time.sleep(0.05)
+
+                results = future.result()
+                stream_area.empty()
+
+                # While the user reads, answer the other sample questions with
+                # the cheapest model so picking one next is a cache hit. Only
+                # when that model was selected, so no unchosen provider is billed.
+                succeeded = any(result['error'] is None for result in results)
+                if (
+                    succeeded
+                    and PREFETCH_MODEL in selected_models
+                    and not st.session_state.get("prefetch_done")
+                ):
+                    st.session_state.prefetch_done = True
+                    st.session_state.prefetch_future = submit(aprefetch_answers([
+                        (
+                            build_system_message(retrieve_context(st.session_state.context, q))
+                            if use_rag else system_message,
+                            q
                         )
-                        results.append(result)
+                        for q in sample_questions if q != question
+                    ]))
+                    st.session_state.prefetch_future.add_done_callback(log_prefetch_error)
 
                 # Store results
                 st.session_state.results = results
@@ -145,7 +232,8 @@ if "results" in st.session_state:
     # Display responses
     st.markdown("### Responses")
     for result in results:
-        with st.expander(f"**{result['model']}** - ${result['cost']:.4f} | {result['time']:.2f}s"):
+        cached_label = " (cached)" if result.get('cached') else ""
+        with st.expander(f"**{result['model']}**{cached_label} - ${result['cost']:.4f} | {result['time']:.2f}s"):
             if result['error']:
                 st.error(f"Error: {result['error']}")
             else:
@@ -154,71 +242,58 @@ if "results" in st.session_state:
     # Metrics comparison
     st.markdown("### Metrics Comparison")
 
-    # Create metrics dataframe
-    metrics_df = pd.DataFrame([
-        {
-            "Model": r['model'],
-            "Input Tokens": r['input_tokens'],
-            "Output Tokens": r['output_tokens'],
-            "Total Tokens": r['total_tokens'],
-            "Cost ($)": f"${r['cost']:.4f}",
-            "Time (s)": f"{r['time']:.2f}"
-        }
-        for r in results
-    ])
+    # Build the numeric frame once; the table and every chart read from it
+    metrics_df = pd.DataFrame(results)[
+        ['model', 'input_tokens', 'output_tokens', 'total_tokens', 'cost', 'time', 'cached']
+    ]
 
-    st.dataframe(metrics_df, use_container_width=True)
+    st.dataframe(
+        metrics_df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "model": "Model",
+            "input_tokens": st.column_config.NumberColumn("Input Tokens"),
+            "output_tokens": st.column_config.NumberColumn("Output Tokens"),
+            "total_tokens": st.column_config.NumberColumn("Total Tokens"),
+            "cost": st.column_config.NumberColumn("Cost ($)", format="$%.4f"),
+            "time": st.column_config.NumberColumn("Time (s)", format="%.2fs"),
+            "cached": st.column_config.CheckboxColumn("Cached")
+        }
+    )
 
     # Charts
     st.markdown("### Visual Comparison")
 
-    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
-
-    # Cost comparison
-    axes[0, 0].bar([r['model'] for r in results], [r['cost'] for r in results], color=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728'][:len(results)])
-    axes[0, 0].set_title('Cost Comparison')
-    axes[0, 0].set_ylabel('Cost ($)')
-    axes[0, 0].tick_params(axis='x', rotation=45)
-
-    # Time comparison
-    axes[0, 1].bar([r['model'] for r in results], [r['time'] for r in results], color=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728'][:len(results)])
-    axes[0, 1].set_title('Response Time Comparison')
-    axes[0, 1].set_ylabel('Time (seconds)')
-    axes[0, 1].tick_params(axis='x', rotation=45)
-
-    # Token usage
-    models = [r['model'] for r in results]
-    input_tokens = [r['input_tokens'] for r in results]
-    output_tokens = [r['output_tokens'] for r in results]
-
-    x = range(len(models))
-    width = 0.35
-    axes[1, 0].bar([i - width/2 for i in x], input_tokens, width, label='Input', color='#1f77b4')
-    axes[1, 0].bar([i + width/2 for i in x], output_tokens, width, label='Output', color='#ff7f0e')
-    axes[1, 0].set_title('Token Usage Comparison')
-    axes[1, 0].set_ylabel('Tokens')
-    axes[1, 0].set_xticks(x)
-    axes[1, 0].set_xticklabels(models, rotation=45, ha='right')
-    axes[1, 0].legend()
-
-    # Cost vs Time scatter
-    axes[1, 1].scatter([r['cost'] for r in results], [r['time'] for r in results], s=100, alpha=0.6, color=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728'][:len(results)])
-    for i, r in enumerate(results):
-        axes[1, 1].annotate(r['model'], (r['cost'], r['time']), fontsize=8, ha='right')
-    axes[1, 1].set_title('Cost vs Time Trade-off')
-    axes[1, 1].set_xlabel('Cost ($)')
-    axes[1, 1].set_ylabel('Time (seconds)')
-    axes[1, 1].grid(True, alpha=0.3)
-
-    plt.tight_layout()
-    st.pyplot(fig)
+    chart_col1, chart_col2 = st.columns(2)
+    with chart_col1:
+        # Cost comparison
+        st.markdown("**Cost Comparison**")
+        st.bar_chart(metrics_df, x="model", y="cost", color="model", y_label="Cost ($)")
+
+        # Token usage
+        st.markdown("**Token Usage Comparison**")
+        st.bar_chart(metrics_df, x="model", y=["input_tokens", "output_tokens"], y_label="Tokens", stack=False)
+    with chart_col2:
+        # Time comparison
+        st.markdown("**Response Time Comparison**")
+        st.bar_chart(metrics_df, x="model", y="time", color="model", y_label="Time (seconds)")
+
+        # Cost vs Time scatter
+        st.markdown("**Cost vs Time Trade-off**")
+        st.scatter_chart(metrics_df, x="cost", y="time", color="model", size=100, x_label="Cost ($)", y_label="Time (seconds)")
 
     # Key findings
     st.markdown("### 🔍 Key Findings")
 
-    if len(results) > 1:
-        cheapest = min(results, key=lambda x: x['cost'])
-        fastest = min(results, key=lambda x: x['time'])
+    # Cached answers cost nothing and return instantly, so they would always win
+    live_results = [r for r in results if not r['cached']]
+    if len(live_results) < len(results):
+        st.caption("Cached responses are excluded from the findings below.")
+
+    if len(live_results) > 1:
+        cheapest = min(live_results, key=lambda x: x['cost'])
+        fastest = min(live_results, key=lambda x: x['time'])
 
         col1, col2 = st.columns(2)
         with col1:
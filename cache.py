@@ -0,0 +1,153 @@
+"""
+Response cache module for reusing LLM answers across repeated questions.
+
+Two tiers are checked in order:
+- Exact: sha256 of (model, context, question) looked up in SQLite
+- Semantic: nearest cached question for the same model and context,
+  found with a sqlite-vec KNN search over question embeddings
+"""
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+
+import sqlite_vec
+import streamlit as st
+
+from embeddings import EMBEDDING_DIM, embed_question
+
+
+def hash_text(text):
+    """
+    Hash text with sha256.
+
+    Args:
+        text: Text to hash
+
+    Returns:
+        Hex digest string
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of model results with exact and semantic lookup.
+    """
+
+    def __init__(self, db_path=".llm_cache.db", ttl=7 * 24 * 3600, max_distance=0.05):
+        """
+        Args:
+            db_path: Path of the SQLite database file
+            ttl: Seconds a cached response stays valid
+            max_distance: Maximum cosine distance for a semantic hit
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_distance = max_distance
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response JSON, ts INTEGER)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS questions USING vec0("
+                f"embedding float[{EMBEDDING_DIM}] distance_metric=cosine, "
+                "model TEXT, context_hash TEXT, +key TEXT)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Streamlit runs each rerun on its own thread, so connect per operation
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.enable_load_extension(True)
+            sqlite_vec.load(conn)
+            conn.enable_load_extension(False)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(model_name, context_hash, question):
+        payload = json.dumps(
+            {"model": model_name, "ctx": context_hash, "q": question},
+            sort_keys=True
+        )
+        return hash_text(payload)
+
+    def lookup(self, model_name, context_hash, question):
+        """
+        Look up a cached result, trying an exact match first.
+
+        Args:
+            model_name: Name of the model
+            context_hash: hash_text of the full document context
+            question: User question
+
+        Returns:
+            Cached result dict or None on a miss
+        """
+        min_ts = int(time.time()) - self.ttl
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND ts >= ?",
+                (self._key(model_name, context_hash, question), min_ts)
+            ).fetchone()
+
+            if row is None:
+                # Run the KNN query on its own: joining on the +key auxiliary
+                # column pushes that constraint into vec0, which rejects it
+                nearest = conn.execute(
+                    "SELECT key, distance FROM questions "
+                    "WHERE embedding MATCH ? AND k = 1 "
+                    "AND model = ? AND context_hash = ?",
+                    (embed_question(question), model_name, context_hash)
+                ).fetchone()
+
+                if nearest is not None and nearest[1] < self.max_distance:
+                    row = conn.execute(
+                        "SELECT response FROM responses WHERE key = ? AND ts >= ?",
+                        (nearest[0], min_ts)
+                    ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def store(self, model_name, context_hash, question, result):
+        """
+        Store a result under both cache tiers.
+
+        Args:
+            model_name: Name of the model
+            context_hash: hash_text of the full document context
+            question: User question
+            result: Result dict to cache
+        """
+        key = self._key(model_name, context_hash, question)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, ts) VALUES (?, ?, ?)",
+                (key, json.dumps(result), int(time.time()))
+            )
+            conn.execute("DELETE FROM questions WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT INTO questions (embedding, model, context_hash, key) "
+                "VALUES (?, ?, ?, ?)",
+                (embed_question(question), model_name, context_hash, key)
+            )
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache():
+    """
+    Return the shared response cache.
+
+    Returns:
+        LLMCache instance
+    """
+    return LLMCache()
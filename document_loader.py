@@ -2,9 +2,53 @@
 Document loader module for loading multiple PDFs and counting tokens.
 """
 
-from langchain_community.document_loaders import PyPDFLoader
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import multiprocessing
+import os
+import re
+import streamlit as st
 import tiktoken
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pathlib import Path
+from pdf_reader import load_pdf
+
+
+# Building an encoding reads the BPE ranks, so do it once per process
+_ENC = tiktoken.encoding_for_model("gpt-4")
+
+
+@functools.lru_cache(maxsize=8)
+def _get_enc(model):
+    return tiktoken.encoding_for_model(model)
+
+
+def _clean_pages(pages):
+    # Lines repeated on at least half the pages are running headers/footers
+    if len(pages) >= 3:
+        page_lines = [{line.strip() for line in page.splitlines()} for page in pages]
+        line_counts = Counter(line for lines in page_lines for line in lines if line)
+        repeated = {line for line, count in line_counts.items() if count >= len(pages) / 2}
+    else:
+        repeated = set()
+
+    cleaned = []
+    for page in pages:
+        text = "\n".join(line for line in page.splitlines() if line.strip() not in repeated)
+        # Only rejoin words split across lines, not "4-\nbit" or "-----" rules
+        text = re.sub(r"(?<=[a-z])-\n(?=[a-z])", "", text)
+        text = re.sub(r"\s+", " ", text).strip()
+        cleaned.append(text)
+    return cleaned
+
+
+def _count_page_tokens(page_texts):
+    # The batched encoder skips special-token scanning and runs across threads
+    return [
+        len(tokens)
+        for tokens in _ENC.encode_ordinary_batch(page_texts, num_threads=os.cpu_count())
+    ]
 
 
 def load_documents(documents_dir="documents"):
@@ -15,29 +59,71 @@ def load_documents(documents_dir="documents"):
         documents_dir: Directory containing PDF files
 
     Returns:
-        Tuple of (all_text, token_count, document_names)
+        Tuple of (all_text, token_count, document_names, page_token_counts,
+        raw_token_count), where page_token_counts holds per-page token counts
+        for each document and raw_token_count is the total before removing
+        repeated headers/footers and extra whitespace
     """
     docs_path = Path(documents_dir)
-    pdf_files = list(docs_path.glob("*.pdf"))
+    pdf_files = sorted(docs_path.glob("*.pdf"))
+
+    # Key the cache on file metadata so edited or added PDFs are reloaded
+    fingerprint = tuple(
+        (f.name, f.stat().st_mtime, f.stat().st_size) for f in pdf_files
+    )
+    return _load_documents(str(docs_path), fingerprint)
+
+
+# cache_resource hands back the stored tuple itself; cache_data would pickle
+# and unpickle the multi-MB context on every hit
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_documents(documents_dir, fingerprint):
+    pdf_files = sorted(Path(documents_dir).glob("*.pdf"))
 
-    all_text = ""
+    # PDFs are independent, so parse them in parallel; map keeps the order.
+    # PDFium is not thread-safe, so use processes rather than threads. The
+    # server process already runs threads, so spawn workers instead of forking.
+    pages_per_doc = []
+    if pdf_files:
+        with ProcessPoolExecutor(
+            max_workers=min(8, len(pdf_files)),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            pages_per_doc = list(executor.map(load_pdf, pdf_files))
+
+    raw_page_texts = [page for _, pages in pages_per_doc for page in pages]
+    pages_per_doc = [(name, _clean_pages(pages)) for name, pages in pages_per_doc]
+
+    # Collect the pieces and join once; repeated += would copy the growing text
+    text_parts = []
     document_names = []
+    page_texts = []
+
+    for name, pages in pages_per_doc:
+        text_parts.append(f"\n\n=== Document: {name} ===\n\n")
+        text_parts.append("\n\n".join(pages))
+        document_names.append(name)
+        page_texts.extend(pages)
 
-    for pdf_file in sorted(pdf_files):
-        loader = PyPDFLoader(str(pdf_file))
-        pages = loader.load()
+    all_text = "".join(text_parts)
 
-        doc_text = "\n\n".join([page.page_content for page in pages])
-        all_text += f"\n\n=== Document: {pdf_file.name} ===\n\n{doc_text}"
-        document_names.append(pdf_file.name)
+    # Count tokens page by page instead of re-encoding the concatenated text
+    page_lengths = iter(_count_page_tokens(page_texts))
+    page_token_counts = tuple(
+        tuple(next(page_lengths) for _ in pages) for _, pages in pages_per_doc
+    )
 
-    # Count tokens using tiktoken
-    encoding = tiktoken.encoding_for_model("gpt-4")
-    token_count = len(encoding.encode(all_text))
+    header_tokens = sum(
+        len(_ENC.encode_ordinary(f"\n\n=== Document: {name} ===\n\n"))
+        for name in document_names
+    )
+    token_count = header_tokens + sum(sum(counts) for counts in page_token_counts)
+    raw_token_count = header_tokens + sum(_count_page_tokens(raw_page_texts))
 
-    return all_text, token_count, document_names
+    return all_text, token_count, tuple(document_names), page_token_counts, raw_token_count
 
 
+@st.cache_data(show_spinner=False)
 def count_tokens(text, model="gpt-4"):
     """
     Count tokens in text for a specific model.
@@ -49,5 +135,25 @@ def count_tokens(text, model="gpt-4"):
     Returns:
         Number of tokens
     """
-    encoding = tiktoken.encoding_for_model(model)
+    encoding = _ENC if model == "gpt-4" else _get_enc(model)
     return len(encoding.encode(text))
+
+
+def split_into_chunks(text, chunk_size=512, chunk_overlap=64):
+    """
+    Split text into token-bounded chunks for retrieval.
+
+    Args:
+        text: Text to split
+        chunk_size: Maximum tokens per chunk
+        chunk_overlap: Tokens shared between neighbouring chunks
+
+    Returns:
+        List of chunk texts
+    """
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-4",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return splitter.split_text(text)
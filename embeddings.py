@@ -0,0 +1,52 @@
+"""
+Embeddings module shared by the response cache and the chunk retriever.
+"""
+import functools
+
+import sqlite_vec
+import streamlit as st
+from sentence_transformers import SentenceTransformer
+
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    """
+    Load the sentence embedding model once per process.
+
+    Returns:
+        SentenceTransformer instance
+    """
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+@functools.lru_cache(maxsize=128)
+def embed_question(question):
+    """
+    Embed a question for vector search.
+
+    Args:
+        question: Question text
+
+    Returns:
+        Normalized embedding serialized for sqlite-vec
+    """
+    vector = get_embedder().encode(question, normalize_embeddings=True)
+    return sqlite_vec.serialize_float32(vector.tolist())
+
+
+def embed_chunks(chunks):
+    """
+    Embed document chunks in batches.
+
+    Args:
+        chunks: List of chunk texts
+
+    Returns:
+        List of normalized embeddings serialized for sqlite-vec
+    """
+    vectors = get_embedder().encode(chunks, batch_size=64, normalize_embeddings=True)
+    return [sqlite_vec.serialize_float32(vector.tolist()) for vector in vectors]
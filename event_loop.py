@@ -0,0 +1,39 @@
+"""
+Background event loop module for running async model calls.
+
+Cached model instances keep async HTTP connection pools that are bound to
+the loop they were first used on, so every coroutine runs on one long-lived
+loop instead of a fresh asyncio.run() loop per Streamlit rerun.
+"""
+import asyncio
+import threading
+
+
+_LOOP = asyncio.new_event_loop()
+threading.Thread(target=_LOOP.run_forever, name="async-loop", daemon=True).start()
+
+
+def submit(coro):
+    """
+    Schedule a coroutine on the background loop without waiting for it.
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        concurrent.futures.Future for the coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _LOOP)
+
+
+def run_async(coro):
+    """
+    Run a coroutine on the background loop and wait for its result.
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        The coroutine's return value
+    """
+    return submit(coro).result()
@@ -3,8 +3,20 @@ Model configuration module for different LLM providers.
 """
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
+import functools
+import httpx
 import os
-import requests
+import streamlit as st
+from event_loop import run_async
+
+# Both DeepSeek models and the balance check live on api.deepseek.com, so
+# they share one HTTP/2 client and multiplex over a single connection. It is
+# only ever used from the background event loop.
+_DEEPSEEK_HTTP_CLIENT = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+    timeout=60
+)
 
 
 # Pricing per 1M tokens (input, output)
@@ -32,10 +44,14 @@ MODEL_PRICING = {
 }
 
 
+@functools.lru_cache(maxsize=8)
 def get_model(model_name):
     """
     Initialize and return a model instance.
 
+    Instances are cached so their HTTP connection pools are reused across
+    queries.
+
     Args:
         model_name: Name of the model to initialize
 
@@ -46,6 +62,7 @@ def get_model(model_name):
         return ChatOpenAI(
             model="gpt-5",
             temperature=0,
+            stream_usage=True,
             api_key=os.getenv("OPENAI_API_KEY")
         )
     elif model_name == "claude-sonnet-4-5-20250929":
@@ -58,15 +75,19 @@ def get_model(model_name):
         return ChatOpenAI(
             model="deepseek-chat",
             temperature=0,
+            stream_usage=True,
             api_key=os.getenv("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com"
+            base_url="https://api.deepseek.com",
+            http_async_client=_DEEPSEEK_HTTP_CLIENT
         )
     elif model_name == "deepseek-chat-v3.1":
         return ChatOpenAI(
             model="deepseek-chat",
             temperature=0,
+            stream_usage=True,
             api_key=os.getenv("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com/v3.1_terminus_expires_on_20251015"
+            base_url="https://api.deepseek.com/v3.1_terminus_expires_on_20251015",
+            http_async_client=_DEEPSEEK_HTTP_CLIENT
         )
     else:
         raise ValueError(f"Unknown model: {model_name}")
@@ -90,9 +111,9 @@ def calculate_cost(model_name, input_tokens, output_tokens):
     return input_cost + output_cost
 
 
-def check_deepseek_balance():
+async def acheck_deepseek_balance():
     """
-    Check DeepSeek account balance.
+    Asynchronously check DeepSeek account balance.
 
     Returns:
         Dict with balance information or None if check fails
@@ -103,7 +124,7 @@ def check_deepseek_balance():
             return None
 
         headers = {"Authorization": f"Bearer {api_key}"}
-        response = requests.get(
+        response = await _DEEPSEEK_HTTP_CLIENT.get(
             "https://api.deepseek.com/user/balance",
             headers=headers,
             timeout=10
@@ -114,3 +135,25 @@ def check_deepseek_balance():
         return None
     except Exception:
         return None
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_deepseek_balance():
+    # st.cache_data does not store exceptions, so raising keeps failures uncached
+    balance_info = run_async(acheck_deepseek_balance())
+    if balance_info is None:
+        raise RuntimeError("DeepSeek balance check failed")
+    return balance_info
+
+
+def check_deepseek_balance():
+    """
+    Check DeepSeek account balance, reusing a successful answer for 60 seconds.
+
+    Returns:
+        Dict with balance information or None if check fails
+    """
+    try:
+        return _cached_deepseek_balance()
+    except RuntimeError:
+        return None
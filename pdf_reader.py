@@ -0,0 +1,29 @@
+"""
+PDF text extraction run inside loader worker processes.
+
+Kept free of heavy imports so spawned workers start quickly.
+"""
+import pypdfium2 as pdfium
+
+
+def load_pdf(pdf_file):
+    """
+    Extract the text of every page of a PDF.
+
+    Args:
+        pdf_file: Path to the PDF file
+
+    Returns:
+        Tuple of (file name, list of page texts)
+    """
+    pdf = pdfium.PdfDocument(str(pdf_file))
+    try:
+        # PDFium marks line-break hyphens with U+FFFE and drops the newline,
+        # so removing the marker rejoins the split word
+        pages = [
+            page.get_textpage().get_text_range().replace("\ufffe", "")
+            for page in pdf
+        ]
+    finally:
+        pdf.close()
+    return pdf_file.name, pages
@@ -1,52 +1,116 @@
 """
 Query handler module for processing questions with different models.
 """
+import asyncio
+import logging
 import time
 from langchain_core.messages import SystemMessage, HumanMessage
 from model_config import get_model, calculate_cost, MODEL_PRICING
+from cache import get_cache, hash_text
 
 
-def query_model(model_name, context, question):
+logger = logging.getLogger(__name__)
+
+# Cheapest model, used to warm the response cache in the background
+PREFETCH_MODEL = "deepseek-chat"
+
+# Futures for queries currently streaming, keyed by (model, context hash,
+# question); only touched from the background event loop
+_IN_FLIGHT = {}
+
+
+def build_system_message(context):
     """
-    Query a model with context and a question, tracking metrics.
+    Build the system message that carries the document context.
+
+    The message is built once per question and shared by every model,
+    so the large prompt string is only materialized once.
 
     Args:
-        model_name: Name of the model to query
         context: Full document context
-        question: User question
 
     Returns:
-        Dict with response, metrics, and timing information
+        SystemMessage instance
     """
-    # Initialize model
-    model = get_model(model_name)
-
-    # Prepare messages
     system_prompt = f"""Use the given context to answer the question.
 If you don't know the answer, say you don't know. Keep the answer concise.
 
 Context:
 {context}"""
+    return SystemMessage(content=system_prompt)
+
+
+def _chunk_text(chunk):
+    # Anthropic streams content as a list of blocks rather than a string
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "") for block in chunk.content if isinstance(block, dict)
+    )
+
+
+def _cache_lookup(model_name, context_hash, question):
+    # The cache is an optimization; treat any failure as a miss
+    try:
+        return get_cache().lookup(model_name, context_hash, question)
+    except Exception:
+        logger.warning("Response cache lookup failed", exc_info=True)
+        return None
 
+
+def _cache_store(model_name, context_hash, question, result):
+    # A failed store must not discard an answer that was already paid for
+    try:
+        get_cache().store(model_name, context_hash, question, result)
+    except Exception:
+        logger.warning("Response cache store failed", exc_info=True)
+
+
+def _reuse_result(result, start_time, on_token):
+    if on_token:
+        on_token(result["response"])
+    # Report what this call actually cost: no tokens, only the waiting time
+    return {
+        **result,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "cost": 0,
+        "time": time.perf_counter() - start_time,
+        "cached": True
+    }
+
+
+async def _astream_model(model_name, system_message, question, on_token, start_time):
+    # Initialize model
+    model = get_model(model_name)
+
+    # Prepare messages
     messages = [
-        SystemMessage(content=system_prompt),
+        system_message,
         HumanMessage(content=question)
     ]
 
-    # Track timing
-    start_time = time.time()
-
     # Query model
     try:
-        response = model.invoke(messages)
-        elapsed_time = time.time() - start_time
+        response = None
+        response_parts = []
+        async for chunk in model.astream(messages):
+            # Summing chunks merges their metadata, including the final usage
+            response = chunk if response is None else response + chunk
+            text = _chunk_text(chunk)
+            if text:
+                response_parts.append(text)
+                if on_token:
+                    on_token(text)
+        elapsed_time = time.perf_counter() - start_time
 
         # Extract token usage
         if hasattr(response, 'response_metadata') and 'token_usage' in response.response_metadata:
             token_usage = response.response_metadata['token_usage']
             input_tokens = token_usage.get('prompt_tokens', 0)
             output_tokens = token_usage.get('completion_tokens', 0)
-        elif hasattr(response, 'usage_metadata'):
+        elif getattr(response, 'usage_metadata', None):
             # LangChain's unified format
             input_tokens = response.usage_metadata.get('input_tokens', 0)
             output_tokens = response.usage_metadata.get('output_tokens', 0)
@@ -59,17 +123,18 @@ Context:
 
         return {
             "model": MODEL_PRICING[model_name]["name"],
-            "response": response.content,
+            "response": "".join(response_parts),
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
             "total_tokens": input_tokens + output_tokens,
             "cost": cost,
             "time": elapsed_time,
-            "error": None
+            "error": None,
+            "cached": False
         }
 
     except Exception as e:
-        elapsed_time = time.time() - start_time
+        elapsed_time = time.perf_counter() - start_time
 
         # Create more helpful error messages
         error_msg = str(e)
@@ -86,5 +151,112 @@ Context:
             "total_tokens": 0,
             "cost": 0,
             "time": elapsed_time,
-            "error": error_msg
+            "error": error_msg,
+            "cached": False
         }
+
+
+async def aquery_model(model_name, system_message, question, on_token=None, context_hash=None):
+    """
+    Asynchronously query a model with context and a question, tracking metrics.
+
+    The response is streamed; each piece of text is passed to on_token as it
+    arrives so callers can render the answer incrementally.
+
+    Args:
+        model_name: Name of the model to query
+        system_message: System message built by build_system_message
+        question: User question
+        on_token: Optional callback receiving each streamed text fragment
+        context_hash: hash_text of system_message.content, if already known
+
+    Returns:
+        Dict with response, metrics, and timing information
+    """
+    # Track timing
+    start_time = time.perf_counter()
+
+    # Serve repeated questions from the response cache. Hashing, embedding
+    # and SQLite are blocking, so keep them off the shared event loop.
+    if context_hash is None:
+        context_hash = await asyncio.to_thread(hash_text, system_message.content)
+    cached = await asyncio.to_thread(_cache_lookup, model_name, context_hash, question)
+    if cached is not None:
+        return _reuse_result(cached, start_time, on_token)
+
+    # Share the answer of an identical query that is already streaming,
+    # e.g. a background prefetch of this question
+    key = (model_name, context_hash, question)
+    pending = _IN_FLIGHT.get(key)
+    if pending is not None:
+        result = await asyncio.shield(pending)
+        if result["error"] is None:
+            return _reuse_result(result, start_time, on_token)
+
+    in_flight = asyncio.get_running_loop().create_future()
+    _IN_FLIGHT[key] = in_flight
+    try:
+        result = await _astream_model(model_name, system_message, question, on_token, start_time)
+    except BaseException:
+        in_flight.cancel()
+        raise
+    finally:
+        if _IN_FLIGHT.get(key) is in_flight:
+            del _IN_FLIGHT[key]
+    in_flight.set_result(result)
+
+    if result["error"] is None:
+        await asyncio.to_thread(_cache_store, model_name, context_hash, question, result)
+    return result
+
+
+async def aquery_models(model_names, system_message, question, on_token=None):
+    """
+    Query several models concurrently with the same context and question.
+
+    Args:
+        model_names: Names of the models to query
+        system_message: System message built by build_system_message
+        question: User question
+        on_token: Optional callback receiving (model_name, text) for each
+            streamed text fragment
+
+    Returns:
+        List of result dicts, in the same order as model_names
+    """
+    def token_callback(model_name):
+        if on_token is None:
+            return None
+        return lambda text: on_token(model_name, text)
+
+    # Hash the shared prompt once rather than once per model
+    context_hash = await asyncio.to_thread(hash_text, system_message.content)
+
+    return await asyncio.gather(
+        *[
+            aquery_model(
+                model_name, system_message, question,
+                token_callback(model_name), context_hash
+            )
+            for model_name in model_names
+        ]
+    )
+
+
+async def aprefetch_answers(prompts, model_name=PREFETCH_MODEL):
+    """
+    Answer likely follow-up questions ahead of time to fill the response cache.
+
+    Args:
+        prompts: List of (system_message, question) pairs to prefetch
+        model_name: Name of the model to query
+
+    Returns:
+        List of result dicts, in the same order as prompts
+    """
+    return await asyncio.gather(
+        *[
+            aquery_model(model_name, system_message, question)
+            for system_message, question in prompts
+        ]
+    )
@@ -0,0 +1,98 @@
+"""
+Retriever module for sending only the most relevant chunks to the models.
+"""
+import sqlite3
+import threading
+
+import sqlite_vec
+import streamlit as st
+
+from document_loader import split_into_chunks
+from embeddings import EMBEDDING_DIM, embed_chunks, embed_question
+
+
+class ChunkIndex:
+    """
+    In-memory sqlite-vec index over the chunks of one document context.
+    """
+
+    def __init__(self, context):
+        """
+        Args:
+            context: Full document context to split and index
+        """
+        self.chunks = split_into_chunks(context)
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        # Some Python builds (default pyenv, macOS system Python) compile
+        # sqlite3 without loadable-extension support
+        if not hasattr(self._conn, "enable_load_extension"):
+            raise RuntimeError(
+                "this Python's sqlite3 module cannot load extensions, which sqlite-vec needs"
+            )
+        try:
+            self._conn.enable_load_extension(True)
+            sqlite_vec.load(self._conn)
+            self._conn.enable_load_extension(False)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"could not load sqlite-vec: {e}") from e
+
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE chunks USING vec0("
+            f"embedding float[{EMBEDDING_DIM}] distance_metric=cosine)"
+        )
+        self._conn.executemany(
+            "INSERT INTO chunks (rowid, embedding) VALUES (?, ?)",
+            enumerate(embed_chunks(self.chunks), start=1)
+        )
+
+    def search(self, question, k=8):
+        """
+        Find the chunks closest to a question.
+
+        Args:
+            question: User question
+            k: Number of chunks to return
+
+        Returns:
+            List of chunk texts, in document order
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid FROM chunks WHERE embedding MATCH ? AND k = ?",
+                (embed_question(question), k)
+            ).fetchall()
+        return [self.chunks[rowid - 1] for rowid in sorted(row[0] for row in rows)]
+
+
+@st.cache_resource(show_spinner="Indexing document chunks...", max_entries=4)
+def get_index(context):
+    """
+    Build, or reuse, the chunk index for a document context.
+
+    Args:
+        context: Full document context
+
+    Returns:
+        ChunkIndex instance
+    """
+    return ChunkIndex(context)
+
+
+def retrieve_context(context, question, k=8):
+    """
+    Reduce the document context to the chunks most relevant to a question.
+
+    Args:
+        context: Full document context
+        question: User question
+        k: Number of chunks to keep
+
+    Returns:
+        Retrieved chunks joined into a single context string
+
+    Raises:
+        RuntimeError: If sqlite-vec cannot be loaded in this Python build
+    """
+    return "\n\n---\n\n".join(get_index(context).search(question, k))